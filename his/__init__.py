@@ -1,2 +1,2 @@
-from . import mpx
-from .his import read, write
+from . import archive, mpx
+from .his import BLOCK_BYTES, TailReader, read, read_header, write
@@ -0,0 +1,289 @@
+"""Store many SOBEK HIS files in one compressed, chunked archive.
+
+The archive is a zip file (without zip compression) with one folder per HIS
+file. Each folder holds the raw header, the time steps and the data split in
+chunks of a block of timesteps by a block of stations. Every chunk holds all
+parameters, is byte shuffled (like blosc) and then compressed, so reading a
+selection only decompresses the chunks it touches:
+
+    index.json                  list of entries
+    <entry>/index.json          dimensions, chunk sizes, codec and checksum
+    <entry>/header.bin          raw header up to the first timestep
+    <entry>/times.bin           compressed int32 time steps
+    <entry>/tail.bin            bytes of an incomplete trailing timestep
+    <entry>/hia                 the .hia sidecar file, if there is one
+    <entry>/c<t>_<s>            compressed chunk (noout, ntime, nstation)
+
+The zstd codec needs the zstandard package; zlib and lzma are always available.
+"""
+
+import configparser
+import hashlib
+import io
+import json
+import lzma
+import os
+import zipfile
+import zlib
+from datetime import timedelta
+from os.path import getsize
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+from .his import _map_records, _read_header, _read_times, _update_long
+
+
+def _codec(name):
+    """Return the (compress, decompress) functions of a codec."""
+    if name == "zstd":
+        import zstandard
+
+        return (
+            zstandard.ZstdCompressor(level=3).compress,
+            zstandard.ZstdDecompressor().decompress,
+        )
+    if name == "lzma":
+        return lzma.compress, lzma.decompress
+    if name == "zlib":
+        return (lambda data: zlib.compress(data, 6)), zlib.decompress
+    raise ValueError(f"Unknown codec: {name}")
+
+
+def default_codec():
+    """zstd if the zstandard package is installed, zlib otherwise."""
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return "zlib"
+    return "zstd"
+
+
+def _shuffle(a):
+    """Group the n-th bytes of all values together, which compresses better."""
+    a = np.ascontiguousarray(a)
+    return a.view(np.uint8).reshape(-1, a.itemsize).T.tobytes()
+
+
+def _unshuffle(data, dtype, shape):
+    dtype = np.dtype(dtype)
+    shuffled = np.frombuffer(data, np.uint8).reshape(dtype.itemsize, -1)
+    return np.ascontiguousarray(shuffled.T).view(dtype).reshape(shape)
+
+
+def add(archive, hisfile, entry, codec=None, time_block=1024, station_block=64):
+    """
+    Add a hisfile to an open archive (a zipfile.ZipFile in write or append mode)
+
+    Returns the entry index, which includes the raw and compressed sizes.
+    """
+    codec = codec or default_codec()
+    compress, _ = _codec(codec)
+    filesize = getsize(hisfile)
+    sha1 = hashlib.sha1()
+    with open(hisfile, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha1.update(block)
+        f.seek(0)
+        info = _read_header(f, filesize)
+        noout, noseg, notim = info["noout"], info["noseg"], info["notim"]
+        f.seek(0)
+        header_bytes = f.read(info["offset"])
+        if notim:
+            ts = _read_times(f, noout, noseg, notim)
+            data = _map_records(hisfile, noout, noseg, notim, info["offset"])
+        else:
+            ts = np.zeros(0, np.int32)
+            data = np.zeros((noout, 0, noseg), np.float32)
+        f.seek(info["offset"] + notim * 4 * (noout * noseg + 1))
+        tail = f.read()
+
+    stored = 0
+
+    def put(name, payload):
+        nonlocal stored
+        stored += len(payload)
+        archive.writestr(f"{entry}/{name}", payload)
+
+    put("header.bin", header_bytes)
+    put("times.bin", compress(ts.astype(np.int32).tobytes()))
+    put("tail.bin", tail)
+    hia_path = Path(hisfile).with_suffix(".hia")
+    has_hia = hia_path.is_file()
+    if has_hia:
+        put("hia", hia_path.read_bytes())
+
+    for t, t0 in enumerate(range(0, notim, time_block)):
+        for s, s0 in enumerate(range(0, noseg, station_block)):
+            chunk = data[:, t0 : t0 + time_block, s0 : s0 + station_block]
+            put(f"c{t}_{s}", compress(_shuffle(chunk.astype(np.float32))))
+
+    index = dict(
+        noout=noout,
+        noseg=noseg,
+        notim=notim,
+        filesize=filesize,
+        sha1=sha1.hexdigest(),
+        codec=codec,
+        time_block=time_block,
+        station_block=station_block,
+        hia=has_hia,
+        stored_bytes=stored,
+    )
+    archive.writestr(f"{entry}/index.json", json.dumps(index, indent=2))
+    return index
+
+
+def create(archive_path, hisfiles, codec=None, time_block=1024, station_block=64):
+    """
+    Create an archive from a mapping of entry name to hisfile path
+
+    Returns a mapping of entry name to entry index.
+    """
+    indexes = {}
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_STORED) as archive:
+        for entry, hisfile in hisfiles.items():
+            indexes[entry] = add(
+                archive, hisfile, entry, codec, time_block, station_block
+            )
+        archive.writestr("index.json", json.dumps(sorted(indexes), indent=2))
+    return indexes
+
+
+class Archive:
+    """
+    Read hisfiles from an archive, decompressing only the chunks that are needed
+
+    Use as a context manager, or call close when done.
+    """
+
+    def __init__(self, archive_path):
+        self._zip = zipfile.ZipFile(archive_path, "r")
+        self.entries = json.loads(self._zip.read("index.json"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._zip.close()
+
+    def index(self, entry):
+        return json.loads(self._zip.read(f"{entry}/index.json"))
+
+    def header(self, entry, hia=True):
+        """The header of an entry, like his.read_header."""
+        index = self.index(entry)
+        header_bytes = self._zip.read(f"{entry}/header.bin")
+        info = _read_header(io.BytesIO(header_bytes), index["filesize"])
+        if hia and index["hia"]:
+            config = configparser.ConfigParser(interpolation=None)
+            config.read_string(
+                self._zip.read(f"{entry}/hia").decode("utf-8", "replace")
+            )
+            info["locs"] = _update_long(info["locs"], config, "Long Locations")
+            info["params"] = _update_long(info["params"], config, "Long Parameters")
+        return info
+
+    def read(self, entry, hia=True, parameters=None, stations=None, time=None):
+        """
+        Read an entry to a xarray.Dataset, like his.read
+
+        The selection is given by lists of parameter and station names and
+        a slice of time indices; only the chunks it overlaps are decompressed.
+        """
+        index = self.index(entry)
+        info = self.header(entry, hia)
+        _, decompress = _codec(index["codec"])
+        tb, sb = index["time_block"], index["station_block"]
+        noout, notim = index["noout"], index["notim"]
+
+        param_idx = (
+            list(range(noout))
+            if parameters is None
+            else [info["params"].index(p) for p in parameters]
+        )
+        station_idx = (
+            np.arange(index["noseg"])
+            if stations is None
+            else np.array([info["locs"].index(s) for s in stations], dtype=int)
+        )
+        time_idx = np.arange(notim)[time if time is not None else slice(None)]
+
+        ts = np.frombuffer(decompress(self._zip.read(f"{entry}/times.bin")), np.int32)
+        data = np.zeros((len(param_idx), len(time_idx), len(station_idx)), np.float32)
+        for t in np.unique(time_idx // tb):
+            t0 = t * tb
+            nt = min(tb, notim - t0)
+            t_sel = (time_idx >= t0) & (time_idx < t0 + nt)
+            for s in np.unique(station_idx // sb):
+                s0 = s * sb
+                ns = min(sb, index["noseg"] - s0)
+                s_sel = (station_idx >= s0) & (station_idx < s0 + ns)
+                raw = decompress(self._zip.read(f"{entry}/c{t}_{s}"))
+                chunk = _unshuffle(raw, np.float32, (noout, nt, ns))
+                block = chunk[param_idx][:, time_idx[t_sel] - t0][
+                    :, :, station_idx[s_sel] - s0
+                ]
+                data[np.ix_(range(len(param_idx)), t_sel, s_sel)] = block
+
+        t0, dt = info["t0"], info["scu"]
+        ds = xr.Dataset(
+            {
+                info["params"][p]: (["time", "station"], data[i, ...])
+                for (i, p) in enumerate(param_idx)
+            },
+            coords={
+                "time": [t0 + timedelta(seconds=int(ts[t]) * dt) for t in time_idx],
+                "station": [info["locs"][s] for s in station_idx],
+            },
+            attrs=dict(header=info["header"], scu=dt, t0=t0),
+        )
+        return ds
+
+    def restore(self, entry, hisfile):
+        """
+        Write an entry back to a hisfile (and .hia) identical to the original
+
+        The records are rebuilt from the raw chunks, so repeated parameter or
+        station names are kept. Raises ValueError if the checksum differs.
+        """
+        index = self.index(entry)
+        _, decompress = _codec(index["codec"])
+        tb, sb = index["time_block"], index["station_block"]
+        noout, noseg, notim = index["noout"], index["noseg"], index["notim"]
+        ts = np.frombuffer(decompress(self._zip.read(f"{entry}/times.bin")), np.int32)
+        dtype = np.dtype([("ts", np.int32), ("data", np.float32, (noseg, noout))])
+
+        sha1 = hashlib.sha1()
+        partial = Path(f"{hisfile}.partial")
+        with open(partial, "wb") as f:
+
+            def put(payload):
+                sha1.update(payload)
+                f.write(payload)
+
+            put(self._zip.read(f"{entry}/header.bin"))
+            for t, t0 in enumerate(range(0, notim, tb)):
+                nt = min(tb, notim - t0)
+                records = np.empty(nt, dtype)
+                records["ts"] = ts[t0 : t0 + nt]
+                for s, s0 in enumerate(range(0, noseg, sb)):
+                    ns = min(sb, noseg - s0)
+                    raw = decompress(self._zip.read(f"{entry}/c{t}_{s}"))
+                    chunk = _unshuffle(raw, np.float32, (noout, nt, ns))
+                    records["data"][:, s0 : s0 + ns, :] = chunk.transpose(1, 2, 0)
+                put(records.tobytes())
+            put(self._zip.read(f"{entry}/tail.bin"))
+
+        if sha1.hexdigest() != index["sha1"]:
+            partial.unlink()
+            raise ValueError(f"Checksum mismatch restoring {entry}")
+        os.replace(partial, hisfile)
+        if index["hia"]:
+            Path(hisfile).with_suffix(".hia").write_bytes(
+                self._zip.read(f"{entry}/hia")
+            )
@@ -8,6 +8,7 @@ changelog:
 """
 
 import configparser
+import struct
 from datetime import datetime, timedelta
 from os.path import getsize
 from pathlib import Path
@@ -17,6 +18,10 @@ import numpy as np
 import pandas as pd
 import xarray as xr
 
+# records are decoded in blocks of about this size, so reading needs little more
+# memory than the data itself
+BLOCK_BYTES = 16 * 1024**2
+
 
 def _update_long(lst, config, section):
     if section in config:
@@ -27,52 +32,138 @@ def _update_long(lst, config, section):
     return lst
 
 
-def read(hisfile, hia=True):
+def _read_header(f, filesize):
+    """Read the header of an open hisfile, leaving f at the first timestep."""
+    header = f.read(120).decode("utf-8")
+    timeinfo = f.read(40).decode("utf-8")
+    datestr = timeinfo[4:14].replace(" ", "0") + timeinfo[14:23]
+    startdate = datetime.strptime(datestr, "%Y.%m.%d %H:%M:%S")
+    try:
+        dt = int(timeinfo[30:-2])  # assumes unit is seconds
+    except ValueError:
+        # in some RIBASIM his files the s is one place earlier
+        dt = int(timeinfo[30:-3])
+    noout, noseg = unpack("ii", f.read(8))
+    notim = int(
+        ((filesize - 168 - noout * 20 - noseg * 24) / (4 * (noout * noseg + 1)))
+    )
+    params = [(f.read(20).rstrip()).decode("utf-8") for _ in range(noout)]
+    locnrs, locs = [], []
+    for i in range(noseg):
+        locnrs.append(unpack("i", f.read(4))[0])
+        locs.append((f.read(20).rstrip()).decode("utf-8"))
+    return dict(
+        header=header,
+        scu=dt,
+        t0=startdate,
+        noout=noout,
+        noseg=noseg,
+        notim=notim,
+        params=params,
+        locnrs=locnrs,
+        locs=locs,
+        offset=f.tell(),
+    )
+
+
+def _read_records(f, noout, noseg, count, out=None):
+    """Read count timestep records, returning the time steps and the data.
+
+    The data has shape (noout, count, noseg). It is decoded block by block into
+    out if that is given, or into a new array otherwise.
+    """
+    record = np.dtype([("ts", np.int32), ("data", np.float32, (noseg, noout))])
+    if out is None:
+        out = np.empty((noout, count, noseg), np.float32)
+    ts = np.empty(count, np.int32)
+    block = np.empty(max(1, min(count, BLOCK_BYTES // record.itemsize)), record)
+    for start in range(0, count, len(block)):
+        n = min(len(block), count - start)
+        if f.readinto(memoryview(block[:n]).cast("B")) != n * record.itemsize:
+            raise ValueError("hisfile ended before the last timestep")
+        ts[start : start + n] = block["ts"][:n]
+        out[:, start : start + n, :] = block["data"][:n].transpose(2, 0, 1)
+    return ts, out
+
+
+def _apply_hia(hisfile, params, locs):
+    # if there is a hia file next to the his, use the long locations
+    hia_path = Path(hisfile).with_suffix(".hia")
+    if hia_path.is_file():
+        config = configparser.ConfigParser(interpolation=None)
+        config.read(hia_path)
+        locs = _update_long(locs, config, "Long Locations")
+        params = _update_long(params, config, "Long Parameters")
+    return params, locs
+
+
+def read_header(hisfile, hia=True):
+    """
+    Read only the header of a hisfile to a dict
+
+    The dict holds the header, scu and t0 attributes, the dimensions, the
+    parameter and location names and the byte offset of the first timestep.
+    If hia is True, the long names from the .hia sidecar file are used.
+    """
+    filesize = getsize(hisfile)
+    if filesize == 0:
+        raise ValueError(f"HIS file is empty: {hisfile}")
+    with open(hisfile, "rb") as f:
+        info = _read_header(f, filesize)
+    if hia:
+        params, locs = _apply_hia(hisfile, info["params"], info["locs"])
+        info["params"], info["locs"] = params, locs
+    return info
+
+
+def _read_times(f, noout, noseg, count):
+    """Read only the time steps of count records, about BLOCK_BYTES at a time."""
+    recsize = 4 * (noout * noseg + 1)
+    ts = np.empty(count, np.int32)
+    block = np.empty(
+        (max(1, min(count, BLOCK_BYTES // recsize)), recsize // 4), np.int32
+    )
+    for start in range(0, count, len(block)):
+        n = min(len(block), count - start)
+        if f.readinto(memoryview(block[:n]).cast("B")) != n * recsize:
+            raise ValueError("hisfile ended before the last timestep")
+        ts[start : start + n] = block[:n, 0]
+    return ts
+
+
+def _map_records(hisfile, noout, noseg, count, offset):
+    """Memory-map count records, returning a (noout, count, noseg) view of the data."""
+    record = np.dtype([("ts", np.int32), ("data", np.float32, (noseg, noout))])
+    records = np.memmap(hisfile, record, mode="r", offset=offset, shape=(count,))
+    return records["data"].transpose(2, 0, 1)
+
+
+def read(hisfile, hia=True, mmap=False):
     """
     Read a hisfile to a xarray.Dataset
 
     If hia is True, it will use the long location names from the .hia sidecar file
     if it exists.
+    If mmap is True, the data is memory-mapped instead of read, so it is only
+    loaded when (a slice of) it is used.
     """
     filesize = getsize(hisfile)
     if filesize == 0:
         raise ValueError(f"HIS file is empty: {hisfile}")
     with open(hisfile, "rb") as f:
-        header = f.read(120).decode("utf-8")
-        timeinfo = f.read(40).decode("utf-8")
-        datestr = timeinfo[4:14].replace(" ", "0") + timeinfo[14:23]
-        startdate = datetime.strptime(datestr, "%Y.%m.%d %H:%M:%S")
-        try:
-            dt = int(timeinfo[30:-2])  # assumes unit is seconds
-        except ValueError:
-            # in some RIBASIM his files the s is one place earlier
-            dt = int(timeinfo[30:-3])
-        noout, noseg = unpack("ii", f.read(8))
-        notim = int(
-            ((filesize - 168 - noout * 20 - noseg * 24) / (4 * (noout * noseg + 1)))
-        )
-        params = [(f.read(20).rstrip()).decode("utf-8") for _ in range(noout)]
-        locnrs, locs = [], []
-        for i in range(noseg):
-            locnrs.append(unpack("i", f.read(4))[0])
-            locs.append((f.read(20).rstrip()).decode("utf-8"))
-        dates = []
-        data = np.zeros((noout, notim, noseg), np.float32)
-        for t in range(notim):
-            ts = unpack("i", f.read(4))[0]
-            date = startdate + timedelta(seconds=ts * dt)
-            dates.append(date)
-            for s in range(noseg):
-                data[:, t, s] = np.fromfile(f, np.float32, noout)
+        info = _read_header(f, filesize)
+        header, dt, startdate = info["header"], info["scu"], info["t0"]
+        noout, noseg, notim = info["noout"], info["noseg"], info["notim"]
+        params, locs = info["params"], info["locs"]
+        if mmap and notim:
+            ts = _read_times(f, noout, noseg, notim)
+            data = _map_records(hisfile, noout, noseg, notim, info["offset"])
+        else:
+            ts, data = _read_records(f, noout, noseg, notim)
+        dates = [startdate + timedelta(seconds=int(t) * dt) for t in ts]
 
     if hia:
-        # if there is a hia file next to the his, use the long locations
-        hia_path = Path(hisfile).with_suffix(".hia")
-        if hia_path.is_file():
-            config = configparser.ConfigParser(interpolation=None)
-            config.read(hia_path)
-            locs = _update_long(locs, config, "Long Locations")
-            params = _update_long(params, config, "Long Parameters")
+        params, locs = _apply_hia(hisfile, params, locs)
 
     ds = xr.Dataset(
         {
@@ -88,6 +179,114 @@ def read(hisfile, hia=True):
     return ds
 
 
+class TailReader:
+    """
+    Read a hisfile that may still be growing, one refresh at a time
+
+    The first call to refresh reads all complete timesteps. Later calls only
+    decode the timesteps appended since then; a partially written trailing
+    timestep is left for the next refresh. If the file is rewritten (it shrank,
+    or its header, first or last read timestep changed) the reader starts over.
+    """
+
+    def __init__(self, hisfile, hia=True):
+        self.hisfile = hisfile
+        self.hia = hia
+        self.dataset = None
+        self._reset()
+
+    def _reset(self):
+        self._info = None
+        self._header_bytes = None
+        self._offset = 0
+        self._notim = 0
+        self._data = None
+        self._dates = []
+        self._boundary = None
+
+    def _read_boundary(self, f):
+        """The raw first and last records read so far, to recognise a rewritten file."""
+        if self._notim == 0:
+            return None
+        recsize = 4 * (self._info["noout"] * self._info["noseg"] + 1)
+        f.seek(self._info["offset"])
+        first = f.read(recsize)
+        f.seek(self._offset - recsize)
+        return first, f.read(recsize)
+
+    def _ensure_capacity(self, notim):
+        noout, noseg = self._info["noout"], self._info["noseg"]
+        capacity = 0 if self._data is None else self._data.shape[1]
+        if notim <= capacity:
+            return
+        # grow geometrically so repeated refreshes copy the data only rarely
+        grown = np.zeros((noout, max(notim, 2 * capacity), noseg), np.float32)
+        if self._data is not None:
+            grown[:, : self._notim, :] = self._data[:, : self._notim, :]
+        self._data = grown
+
+    def refresh(self):
+        """Read new complete timesteps and return the dataset.
+
+        Returns None as long as the file has no complete timestep.
+        """
+        filesize = getsize(self.hisfile)
+        with open(self.hisfile, "rb") as f:
+            if self._info is not None:
+                header_bytes = f.read(self._info["offset"])
+                if (
+                    filesize < self._offset
+                    or header_bytes != self._header_bytes
+                    or self._read_boundary(f) != self._boundary
+                ):
+                    self._reset()
+                    self.dataset = None
+                    f.seek(0)
+            if self._info is None:
+                try:
+                    info = _read_header(f, filesize)
+                except (struct.error, UnicodeDecodeError, ValueError):
+                    return None  # header not completely written yet
+                if info["offset"] > filesize:
+                    return None
+                f.seek(0)
+                self._header_bytes = f.read(info["offset"])
+                if self.hia:
+                    info["params"], info["locs"] = _apply_hia(
+                        self.hisfile, info["params"], info["locs"]
+                    )
+                self._info = info
+                self._offset = info["offset"]
+
+            noout, noseg = self._info["noout"], self._info["noseg"]
+            count = (filesize - self._offset) // (4 * (noout * noseg + 1))
+            if count == 0:
+                return self.dataset
+            self._ensure_capacity(self._notim + count)
+            f.seek(self._offset)
+            out = self._data[:, self._notim : self._notim + count, :]
+            ts, _ = _read_records(f, noout, noseg, count, out)
+            self._notim += count
+            self._offset += count * 4 * (noout * noseg + 1)
+            self._boundary = self._read_boundary(f)
+
+        t0, dt = self._info["t0"], self._info["scu"]
+        self._dates.extend(t0 + timedelta(seconds=int(t) * dt) for t in ts)
+
+        self.dataset = xr.Dataset(
+            {
+                param: (["time", "station"], self._data[i, : self._notim, :])
+                for (i, param) in enumerate(self._info["params"])
+            },
+            coords={
+                "time": self._dates,
+                "station": self._info["locs"],
+            },
+            attrs=dict(header=self._info["header"], scu=dt, t0=t0),
+        )
+        return self.dataset
+
+
 def write(hisfile, ds):
     """Writes an xarray.Dataset with extra attributes to a hisfile."""
     with open(hisfile, "wb") as f:
@@ -110,14 +309,15 @@ def write(hisfile, ds):
             f.write(pack("i", locnr))
             f.write(loc)
         da = ds.to_array()
-        assert da.dims != ("variable", "time", "station")
-        data = da.values.astype(np.float32)
-        for t, date in enumerate(ds.time.values):
-            date = pd.Timestamp(date).to_pydatetime()
-            ts = int((date - t0).total_seconds() / scu)
-            f.write(pack("i", ts))
-            for s in range(noseg):
-                data[:, t, s].tofile(f)
+        assert da.dims == ("variable", "time", "station")
+        record = np.dtype([("ts", np.int32), ("data", np.float32, (noseg, noout))])
+        records = np.empty(notim, record)
+        records["ts"] = [
+            int((pd.Timestamp(date).to_pydatetime() - t0).total_seconds() / scu)
+            for date in ds.time.values
+        ]
+        records["data"] = da.values.astype(np.float32).transpose(1, 2, 0)
+        records.tofile(f)
         countmsg = "hisfile written is not the correct length"
         assert f.tell() == 160 + 8 + 20 * noout + (4 + 20) * noseg + notim * (
             4 + noout * noseg * 4
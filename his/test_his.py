@@ -0,0 +1,58 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from his import TailReader, read, write
+
+
+def _dataset(notim, value):
+    t0 = datetime(2000, 1, 1)
+    return xr.Dataset(
+        {
+            param: (["time", "station"], np.full((notim, 3), value + i, np.float32))
+            for (i, param) in enumerate(["Q", "V"])
+        },
+        coords={
+            "time": pd.date_range(t0, periods=notim, freq="D"),
+            "station": ["A", "B", "C"],
+        },
+        attrs=dict(header="test", scu=86400, t0=t0),
+    )
+
+
+def test_tailreader_reads_appended_timesteps(tmp_path):
+    hisfile = tmp_path / "test.his"
+    write(hisfile, _dataset(50, 1.0))
+    data = hisfile.read_bytes()
+    recsize = 4 * (2 * 3 + 1)
+    # a simulation that has written 40 timesteps and part of the 41st
+    hisfile.write_bytes(data[: len(data) - 10 * recsize + 8])
+
+    reader = TailReader(hisfile)
+    assert reader.refresh().sizes["time"] == 40
+    hisfile.write_bytes(data)
+    ds = reader.refresh()
+    assert ds.sizes["time"] == 50
+    xr.testing.assert_identical(ds, read(hisfile))
+
+
+def test_tailreader_rereads_rewritten_file_with_same_header(tmp_path):
+    hisfile = tmp_path / "test.his"
+    write(hisfile, _dataset(40, 1.0))
+    reader = TailReader(hisfile)
+    assert reader.refresh()["Q"].values.max() == 1.0
+
+    # a rerun of the same case: same header and length, new results
+    write(hisfile, _dataset(40, 5.0))
+    ds = reader.refresh()
+    assert ds.sizes["time"] == 40
+    assert (ds["Q"].values == 5.0).all()
+
+    # a longer rerun must not be appended to the timesteps of the previous run
+    write(hisfile, _dataset(60, 9.0))
+    ds = reader.refresh()
+    assert ds.sizes["time"] == 60
+    assert (ds["Q"].values == 9.0).all()
+    xr.testing.assert_identical(ds, read(hisfile))
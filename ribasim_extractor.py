@@ -11,9 +11,21 @@ import click
 # import argparse
 # import seaborn as sns
 import re
+import sys
+import json
+import time
+import hashlib
+import queue
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
 from pathlib import Path
-from typing import List, Tuple, Optional  # Dict,
+from typing import List, Tuple, Optional, Dict
 import pandas as pd
+import xarray as xr
 import matplotlib.pyplot as plt
 from datetime import datetime  # , timedelta
 from rich.console import Console
@@ -22,8 +34,9 @@ from rich.panel import Panel
 from rich.progress import Progress, SpinnerColumn, TextColumn
 from rich.prompt import Prompt, Confirm
 import inquirer
+from openpyxl import Workbook
 
-from his import read as readhis
+from his import BLOCK_BYTES as HIS_BLOCK_BYTES, TailReader, archive as hisarchive, read as readhis, read_header as readhis_header
 
 
 # Setup #######################
@@ -33,14 +46,256 @@ base_path = r"C:\Ribasim7"
 console = Console()
 
 
+def parse_memory_size(text: str) -> int:
+    """Parse a memory size such as "2GB", "512 MB" or "1.5g" into bytes."""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?\s*', text, re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid memory size: {text}")
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** " kmgt".index(unit.lower() or " "))
+
+
+def format_size(n_bytes: float) -> str:
+    """Format a number of bytes for display."""
+    for unit in ["B", "KB", "MB", "GB"]:
+        if abs(n_bytes) < 1024:
+            return f"{n_bytes:.1f} {unit}"
+        n_bytes /= 1024
+    return f"{n_bytes:.1f} TB"
+
+
+def memory_usage() -> Tuple[int, int]:
+    """Return the current and peak resident memory of this process in bytes."""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                    "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")
+            ]
+
+        kernel32, psapi = ctypes.windll.kernel32, ctypes.windll.psapi
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(ProcessMemoryCounters), wintypes.DWORD]
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb)
+        return counters.WorkingSetSize, counters.PeakWorkingSetSize
+
+    import resource
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        current = peak
+    return current, peak
+
+
+class MemoryBudget:
+    """Plan reading, aggregation and export so the process stays under a memory cap."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+
+    def available(self) -> int:
+        """Bytes still free under the budget, with a floor so work always makes progress."""
+        current, _ = memory_usage()
+        return max(self.max_bytes - current, self.max_bytes // 10)
+
+    def use_mmap(self, header: dict) -> bool:
+        """Whether a .his file should be memory-mapped instead of read eagerly."""
+        # An eager read holds the data plus one block of raw records being decoded
+        data_bytes = 4 * header["noout"] * header["noseg"] * header["notim"]
+        eager_bytes = data_bytes + min(data_bytes, HIS_BLOCK_BYTES)
+        return eager_bytes > self.available() // 2
+
+    def time_chunk(self, dataset) -> int:
+        """Number of timesteps per export block."""
+        # A DataFrame row with its MultiIndex and formatted text takes roughly 8x the raw values
+        per_step = max(dataset.sizes.get("station", 1), 1) * (4 * len(dataset.data_vars) + 16) * 8
+        return max(1, self.available() // 4 // per_step)
+
+    def station_chunk(self, dataset) -> int:
+        """Number of stations per aggregation block."""
+        per_station = max(dataset.sizes.get("time", 1), 1) * 4 * 4
+        return max(1, self.available() // 4 // per_station)
+
+    def report(self) -> bool:
+        """Print whether the peak memory stayed under the budget."""
+        _, peak = memory_usage()
+        met = peak <= self.max_bytes
+        style, verdict = ("green", "met") if met else ("yellow", "exceeded")
+        console.print(f"[{style}]Memory budget {verdict}: peak {format_size(peak)} of "
+                      f"{format_size(self.max_bytes)}[/{style}]")
+        return met
+
+
+EXPORT_FORMATS = ["csv", "excel", "parquet"]
+
+
+def parse_export_formats(export: str) -> List[str]:
+    """Parse a comma separated list of export formats, e.g. "csv,excel,parquet"."""
+    formats = [fmt.strip().lower() for fmt in export.split(",") if fmt.strip()]
+    invalid = [fmt for fmt in formats if fmt not in EXPORT_FORMATS]
+    if invalid or not formats:
+        raise ValueError(f"Invalid export format '{export}'. Choose from {', '.join(EXPORT_FORMATS)} "
+                         f"(comma separated for several).")
+    return list(dict.fromkeys(formats))
+
+
+class BlockWriter(threading.Thread, ABC):
+    """Write an export block by block.
+
+    Blocks are (dataset, data frame) pairs covering consecutive timesteps. They
+    can be passed to write directly, or put on the bounded queue of a started
+    writer thread, followed by None to close the file. A failing writer keeps
+    draining its queue so the producer never blocks on it, and removes its
+    partial file once the queue is closed. Setting error from outside (when
+    producing the blocks failed) discards the export the same way.
+    """
+
+    extension = ""
+
+    def __init__(self, output_path: str, dataset, queue_size: int = 2):
+        super().__init__(daemon=True)
+        self.path = f"{output_path}.{self.extension}"
+        self.queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self.error: Optional[Exception] = None
+        self.busy_seconds = 0.0
+
+    def run(self):
+        while True:
+            block = self.queue.get()
+            if block is None:
+                break
+            if self.error is None:
+                started = time.perf_counter()
+                try:
+                    self.write(*block)
+                except Exception as e:
+                    self.error = e
+                self.busy_seconds += time.perf_counter() - started
+        if self.error is None:
+            try:
+                self.close()
+            except Exception as e:
+                self.error = e
+        if self.error is not None:
+            self.discard()
+
+    @abstractmethod
+    def write(self, dataset, df: pd.DataFrame):
+        """Append one block to the output file."""
+
+    def close(self):
+        pass
+
+    def discard(self):
+        """Remove the partial output file."""
+        Path(self.path).unlink(missing_ok=True)
+
+
+class CsvBlockWriter(BlockWriter):
+    extension = "csv"
+
+    def __init__(self, output_path: str, dataset, queue_size: int = 2):
+        super().__init__(output_path, dataset, queue_size)
+        self._first = True
+
+    def write(self, dataset, df: pd.DataFrame):
+        df.to_csv(self.path, mode='w' if self._first else 'a', header=self._first)
+        self._first = False
+
+
+class ExcelBlockWriter(BlockWriter):
+    """Excel export with a write-only workbook: a summary sheet and a sheet of time/station/value rows per parameter."""
+
+    extension = "xlsx"
+
+    def __init__(self, output_path: str, dataset, queue_size: int = 2):
+        super().__init__(output_path, dataset, queue_size)
+        self._workbook = Workbook(write_only=True)
+        summary_data = RibasimDataExtractor.summary_data(dataset)
+        summary = self._workbook.create_sheet('Summary')
+        summary.append(list(summary_data))
+        for row in zip(*summary_data.values()):
+            summary.append(list(row))
+        self._sheets = {}
+        for var_name in dataset.data_vars:
+            # Write-only sheets can be appended to in any order
+            self._sheets[var_name] = self._workbook.create_sheet(var_name[:31])  # Excel sheet name limit
+            self._sheets[var_name].append(["time", "station", var_name])
+
+    def write(self, dataset, df: pd.DataFrame):
+        stations = [str(station) for station in dataset.station.values]
+        times = [timestamp.to_pydatetime() for timestamp in pd.to_datetime(dataset.time.values)]
+        for var_name, sheet in self._sheets.items():
+            for timestamp, values in zip(times, dataset[var_name].values):
+                for station, value in zip(stations, values.tolist()):
+                    sheet.append([timestamp, station, None if value != value else value])
+
+    def close(self):
+        self._workbook.save(self.path)
+
+    def discard(self):
+        # Finish the temporary sheet files of the unsaved workbook
+        for sheet in self._sheets.values():
+            try:
+                sheet.close()
+            except Exception:
+                pass
+        super().discard()
+
+
+class ParquetBlockWriter(BlockWriter):
+    extension = "parquet"
+
+    def __init__(self, output_path: str, dataset, queue_size: int = 2):
+        super().__init__(output_path, dataset, queue_size)
+        import pyarrow  # optional dependency, only needed for parquet exports
+        import pyarrow.parquet
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self._writer = None
+
+    def write(self, dataset, df: pd.DataFrame):
+        table = self._pa.Table.from_pandas(df.reset_index(), preserve_index=False)
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+    def discard(self):
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+        super().discard()
+
+
+BLOCK_WRITERS = {"csv": CsvBlockWriter, "excel": ExcelBlockWriter, "parquet": ParquetBlockWriter}
+
+
 class RibasimDataExtractor:
     """Main class for extracting and processing Ribasim data."""
 
-    def __init__(self, base_path: str = base_path):
+    def __init__(self, base_path: str = base_path, max_memory: Optional[int] = None):
         self.base_path = Path(base_path)
+        self.budget = MemoryBudget(max_memory) if max_memory else None
         self.selected_basin = None
         self.selected_case = None
         self.available_his_files = []
+        # One tail reader per .his file, so reading it again only decodes new timesteps
+        self.readers: Dict[str, TailReader] = {}
 
     def get_available_basins(self) -> List[str]:
         """Get list of available basins from folders ending with .rbn or .Rbd."""
@@ -110,17 +365,38 @@ class RibasimDataExtractor:
 
         return sorted(his_files)
 
-    def extract_his_data(self, his_file_path: str) -> Optional[object]:
-        """Extract data from a .his file using the provided his module."""
+    def get_his_path(self, his_file_path: str) -> Path:
+        """Full path of a .his file in the selected basin and case."""
+        return self.base_path / self.selected_basin / self.selected_case / his_file_path
+
+    def extract_his_data(self, his_file_path: str, follow: bool = False) -> Optional[object]:
+        """Extract data from a .his file using the provided his module.
+
+        With follow, the file is read through a cached TailReader, so reading it again
+        (e.g. while a simulation is running) only decodes the new timesteps.
+        """
         try:
-            full_path = self.base_path / self.selected_basin / self.selected_case / his_file_path
+            full_path = self.get_his_path(his_file_path)
 
             if not full_path.exists():
                 console.print(f"[red]Error: File {full_path} does not exist[/red]")
                 return None
 
-            # Use the readhis function from his module
-            dataset = readhis(str(full_path))
+            if self.budget is not None and self.budget.use_mmap(readhis_header(str(full_path), hia=False)):
+                console.print("[cyan]Reading lazily (memory-mapped) to stay within the memory budget[/cyan]")
+                return readhis(str(full_path), mmap=True)
+
+            if not follow:
+                return readhis(str(full_path))
+
+            # Use a TailReader from the his module; a running simulation is re-read incrementally
+            reader = self.readers.get(str(full_path))
+            if reader is None:
+                reader = self.readers[str(full_path)] = TailReader(str(full_path))
+
+            dataset = reader.refresh()
+            if dataset is None:
+                console.print(f"[yellow]No complete timesteps in {his_file_path} yet[/yellow]")
             return dataset
 
         except Exception as e:
@@ -132,18 +408,28 @@ class RibasimDataExtractor:
         try:
             if aggregation_type.lower() == "daily":
                 # Resample to daily averages
-                return dataset.resample(time="1D").mean()
+                freq = "1D"
             elif aggregation_type.lower() == "dekadal":
                 # 3 periods per month (10-day periods)
-                return dataset.resample(time="10D").mean()
+                freq = "10D"
             elif aggregation_type.lower() == "monthly":
-                return dataset.resample(time="1M").mean()
+                freq = "1M"
             elif aggregation_type.lower() == "weekly":
-                return dataset.resample(time="1W").mean()
+                freq = "1W"
             else:
                 console.print(f"[yellow]Unknown aggregation type: {aggregation_type}. Using original data.[/yellow]")
                 return dataset
 
+            if self.budget is not None:
+                # Resample blocks of stations so only one block is materialized at a time
+                block = self.budget.station_chunk(dataset)
+                if block < dataset.sizes["station"]:
+                    parts = [dataset.isel(station=slice(start, start + block)).resample(time=freq).mean()
+                             for start in range(0, dataset.sizes["station"], block)]
+                    return xr.concat(parts, dim="station")
+
+            return dataset.resample(time=freq).mean()
+
         except Exception as e:
             console.print(f"[red]Error aggregating data: {e}[/red]")
             return dataset
@@ -212,40 +498,59 @@ class RibasimDataExtractor:
         except Exception as e:
             console.print(f"[red]Error plotting data: {e}[/red]")
 
-    def export_data(self, dataset, export_format: str = "csv", output_path: str = None):
-        """Export data to CSV or Excel format."""
+    def export_data(self, dataset, export_format: str = "csv", output_path: str = None,
+                    dataframe: Optional[pd.DataFrame] = None) -> Optional[str]:
+        """Export data to CSV or Excel format and return the written file path.
+
+        A data frame already converted from the dataset can be passed to avoid converting it again.
+        """
         try:
             if output_path is None:
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 output_path = f"ribasim_export_{timestamp}"
 
             if export_format.lower() == "csv":
-                # Convert xarray dataset to pandas DataFrame and save as CSV
-                df = dataset.to_dataframe()
                 csv_path = f"{output_path}.csv"
-                df.to_csv(csv_path)
+                if self.budget is not None:
+                    # Stream blocks of timesteps so the full DataFrame is never built
+                    chunk = self.budget.time_chunk(dataset)
+                    for start in range(0, max(dataset.sizes["time"], 1), chunk):
+                        df = dataset.isel(time=slice(start, start + chunk)).to_dataframe()
+                        df.to_csv(csv_path, mode='w' if start == 0 else 'a', header=start == 0)
+                else:
+                    # Convert xarray dataset to pandas DataFrame and save as CSV
+                    df = dataset.to_dataframe() if dataframe is None else dataframe
+                    df.to_csv(csv_path)
                 console.print(f"[green]Data exported to {csv_path}[/green]")
+                return csv_path
 
             elif export_format.lower() == "excel":
                 # Export to Excel with multiple sheets for different parameters
                 excel_path = f"{output_path}.xlsx"
-                with pd.ExcelWriter(excel_path, engine='openpyxl') as writer:
-                    # Write summary sheet
-                    summary_data = {
-                        'Parameter': list(dataset.data_vars.keys()),
-                        'Stations': [len(dataset[var].station) for var in dataset.data_vars],
-                        'Time_Points': [len(dataset[var].time) for var in dataset.data_vars],
-                        'Units': [dataset[var].attrs.get('units', 'N/A') for var in dataset.data_vars]
-                    }
-                    pd.DataFrame(summary_data).to_excel(writer, sheet_name='Summary', index=False)
-
-                    # Write data for each parameter
-                    for var_name in dataset.data_vars:
-                        df = dataset[var_name].to_dataframe()
-                        sheet_name = var_name[:31]  # Excel sheet name limit
-                        df.to_excel(writer, sheet_name=sheet_name)
+                if self.budget is not None:
+                    # Stream blocks of timesteps into a write-only workbook
+                    writer = ExcelBlockWriter(output_path, dataset)
+                    chunk = self.budget.time_chunk(dataset)
+                    for start in range(0, dataset.sizes["time"], chunk):
+                        writer.write(dataset.isel(time=slice(start, start + chunk)), None)
+                    writer.close()
+                else:
+                    summary_data = self.summary_data(dataset)
+                    with pd.ExcelWriter(excel_path, engine='openpyxl') as writer:
+                        # Write summary sheet
+                        pd.DataFrame(summary_data).to_excel(writer, sheet_name='Summary', index=False)
+
+                        # Write data for each parameter
+                        for var_name in dataset.data_vars:
+                            if dataframe is None:
+                                df = dataset[var_name].to_dataframe()
+                            else:
+                                df = dataframe[[var_name]]
+                            sheet_name = var_name[:31]  # Excel sheet name limit
+                            df.to_excel(writer, sheet_name=sheet_name)
 
                 console.print(f"[green]Data exported to {excel_path}[/green]")
+                return excel_path
 
             else:
                 console.print(f"[red]Unsupported export format: {export_format}[/red]")
@@ -253,10 +558,226 @@ class RibasimDataExtractor:
         except Exception as e:
             console.print(f"[red]Error exporting data: {e}[/red]")
 
+        return None
+
+    @staticmethod
+    def summary_data(dataset) -> dict:
+        """Columns of the summary sheet of an Excel export."""
+        return {
+            'Parameter': list(dataset.data_vars.keys()),
+            'Stations': [len(dataset[var].station) for var in dataset.data_vars],
+            'Time_Points': [len(dataset[var].time) for var in dataset.data_vars],
+            'Units': [dataset[var].attrs.get('units', 'N/A') for var in dataset.data_vars]
+        }
+
+    def export_multi(self, dataset, export_formats: List[str], output_path: str) -> List[str]:
+        """Export data to several formats in a single pass and return the written file paths.
+
+        Each block of timesteps is converted to a DataFrame once and handed to one writer
+        thread per format through bounded queues, so the total time approaches that of the
+        slowest writer instead of the sum of all of them.
+        """
+        try:
+            writers = [BLOCK_WRITERS[fmt](output_path, dataset) for fmt in export_formats]
+        except Exception as e:
+            console.print(f"[red]Error exporting data: {e}[/red]")
+            return []
+
+        if self.budget is not None:
+            # Every queued block stays alive until the slowest writer is done with it
+            chunk = max(1, self.budget.time_chunk(dataset) // (writers[0].queue.maxsize + 2))
+        else:
+            chunk = max(1, 100_000 // max(dataset.sizes.get("station", 1), 1))
 
-def interactive_mode():
+        for writer in writers:
+            writer.start()
+        try:
+            for start in range(0, max(dataset.sizes["time"], 1), chunk):
+                block = dataset.isel(time=slice(start, start + chunk))
+                df = block.to_dataframe()
+                for writer in writers:
+                    writer.queue.put((block, df))
+        except BaseException as e:
+            # The files are incomplete: make the writers discard them instead of closing them
+            for writer in writers:
+                writer.error = e
+            if not isinstance(e, Exception):
+                raise
+            console.print(f"[red]Error exporting data: {e}[/red]")
+        finally:
+            for writer in writers:
+                writer.queue.put(None)
+            for writer in writers:
+                writer.join()
+
+        written = []
+        for writer in writers:
+            if writer.error is not None:
+                console.print(f"[red]Error exporting data to {writer.path}: {writer.error}[/red]")
+            else:
+                console.print(f"[green]Data exported to {writer.path} ({writer.busy_seconds:.1f}s)[/green]")
+                written.append(writer.path)
+        return written
+
+    def export(self, dataset, export_formats: List[str], output_path: str) -> List[str]:
+        """Export to one or more formats, using a single pass when there are several."""
+        if len(export_formats) == 1 and export_formats[0] in ["csv", "excel"]:
+            written = self.export_data(dataset, export_formats[0], output_path)
+            return [written] if written else []
+        return self.export_multi(dataset, export_formats, output_path)
+
+
+# Files with more data than this are not read speculatively: the read cannot be stopped
+# once it runs, and choosing another file would then hold two large reads at once
+SPECULATIVE_READ_BYTES = 256 * 1024 ** 2
+
+
+class BackgroundLoader:
+    """Run loading jobs on daemon threads while the user is still choosing.
+
+    Daemon threads are used instead of an executor so that Ctrl-C ends the
+    session without waiting for a read that is no longer needed. Jobs are
+    deduplicated by key and at most max_jobs run at the same time.
+    """
+
+    def __init__(self, max_jobs: int = 4):
+        self._slots = threading.Semaphore(max_jobs)
+        self._futures: Dict[tuple, Future] = {}
+
+    def submit(self, key: tuple, fn, *args) -> Future:
+        if key in self._futures:
+            return self._futures[key]
+
+        future = Future()
+
+        def run():
+            with self._slots:
+                if not future.set_running_or_notify_cancel():
+                    return
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+
+        threading.Thread(target=run, daemon=True).start()
+        self._futures[key] = future
+        return future
+
+    def get(self, key: tuple) -> Optional[Future]:
+        return self._futures.get(key)
+
+    def discard(self, key: tuple) -> Optional[Future]:
+        """Forget a job so its result can be freed; it is cancelled if it has not started yet."""
+        future = self._futures.pop(key, None)
+        if future is not None:
+            future.cancel()
+        return future
+
+    @staticmethod
+    def result(future: Future, description: str):
+        """Wait for a job with a spinner; waiting in short steps keeps Ctrl-C responsive."""
+        if not future.done():
+            with Progress(SpinnerColumn(), TextColumn("[progress.description]{task.description}")) as progress:
+                task = progress.add_task(description, total=None)
+                while not future.done():
+                    wait([future], timeout=0.1)
+                progress.update(task, description="Data loaded successfully!")
+        return future.result()
+
+    def cancel_all(self):
+        for future in self._futures.values():
+            future.cancel()
+
+
+def his_description(header: dict) -> str:
+    """First line of the 4 x 40 character description in a .his header."""
+    return header["header"][:40].strip()
+
+
+def his_data_bytes(header: dict) -> int:
+    """Size of the data of a .his file once it is read."""
+    return 4 * header["noout"] * header["noseg"] * header["notim"]
+
+
+class AnalysisSession:
+    """Memoize data derived from the loaded datasets during an interactive session.
+
+    Artifacts (aggregations, data frames, previews, plot data) are keyed by
+    (kind, source, aggregation, selection) and evicted least recently used
+    first once their estimated size exceeds max_bytes.
+    """
+
+    def __init__(self, extractor: RibasimDataExtractor, max_bytes: int = 512 * 1024 ** 2):
+        self.extractor = extractor
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._sources: Dict[str, object] = {}
+        self._artifacts: "OrderedDict[tuple, Tuple[object, int]]" = OrderedDict()
+
+    @staticmethod
+    def _size_of(value) -> int:
+        if isinstance(value, pd.DataFrame):
+            return int(value.memory_usage(index=True).sum())
+        if isinstance(value, (xr.Dataset, xr.DataArray)):
+            return int(value.nbytes)
+        return sys.getsizeof(value)
+
+    def add_source(self, source: str, dataset):
+        """Register (or replace, after a refresh) a loaded dataset, dropping what was derived from it."""
+        self._sources[source] = dataset
+        for key in [key for key in self._artifacts if key[1] == source]:
+            self.nbytes -= self._artifacts.pop(key)[1]
+
+    def memoize(self, kind: str, source: str, aggregation: Optional[str], selection, compute):
+        """Return the cached artifact for the key, or compute and cache it."""
+        key = (kind, source, aggregation, selection)
+        if key in self._artifacts:
+            self._artifacts.move_to_end(key)
+            self.hits += 1
+            return self._artifacts[key][0]
+
+        self.misses += 1
+        value = compute()
+        size = self._size_of(value)
+        if size <= self.max_bytes:
+            self._artifacts[key] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted_size) = self._artifacts.popitem(last=False)
+                self.nbytes -= evicted_size
+        return value
+
+    def dataset(self, source: str, aggregation: Optional[str] = None):
+        if aggregation is None:
+            return self._sources[source]
+        return self.memoize("dataset", source, aggregation, None,
+                            lambda: self.extractor.aggregate_data(self._sources[source], aggregation))
+
+    def dataframe(self, source: str, aggregation: Optional[str] = None):
+        return self.memoize("dataframe", source, aggregation, None,
+                            lambda: self.dataset(source, aggregation).to_dataframe())
+
+    def preview(self, source: str, aggregation: Optional[str] = None, rows: int = 5):
+        """The first rows of the data frame, converting only the timesteps those rows come from."""
+        def compute():
+            dataset = self.dataset(source, aggregation)
+            steps = -(-rows // max(dataset.sizes.get("station", 1), 1))
+            return dataset.isel(time=slice(0, steps)).to_dataframe().head(rows)
+        return self.memoize("preview", source, aggregation, rows, compute)
+
+    def plot_dataset(self, source: str, aggregation: Optional[str], parameter: str, max_stations: int = 10):
+        """The loaded values of one parameter for the stations that are plotted."""
+        return self.memoize("plot", source, aggregation, (parameter, max_stations),
+                            lambda: self.dataset(source, aggregation)[[parameter]]
+                            .isel(station=slice(0, max_stations)).load())
+
+
+def interactive_mode(max_memory: Optional[int] = None):
     """Run the application in interactive mode."""
-    extractor = RibasimDataExtractor()
+    extractor = RibasimDataExtractor(max_memory=max_memory)
+    loader = BackgroundLoader()
 
     try:
         # Step 1: Select Basin
@@ -304,7 +825,22 @@ def interactive_mode():
             console.print("[red]No .his files found in the selected case.[/red]")
             return
 
-        his_choices = [inquirer.List('his_file', message="Select a .his file", choices=his_files)]
+        # Probe the headers in the background and show the descriptions that are ready in time
+        probes = {his_file: loader.submit(("header", his_file), readhis_header, str(extractor.get_his_path(his_file)))
+                  for his_file in his_files}
+        wait(probes.values(), timeout=0.5)
+        his_labels = []
+        for his_file, probe in probes.items():
+            ready = probe.done() and probe.exception() is None
+            his_labels.append((f"{his_file}  -  {his_description(probe.result())}" if ready else his_file, his_file))
+
+        # Speculatively start reading the highlighted (first) file if it is small; never under a memory budget
+        first_probe = probes[his_files[0]]
+        if (extractor.budget is None and first_probe.done() and first_probe.exception() is None
+                and his_data_bytes(first_probe.result()) <= SPECULATIVE_READ_BYTES):
+            loader.submit(("data", his_files[0]), extractor.extract_his_data, his_files[0], True)
+
+        his_choices = [inquirer.List('his_file', message="Select a .his file", choices=his_labels)]
         his_answer = inquirer.prompt(his_choices)
 
         if not his_answer:
@@ -314,21 +850,22 @@ def interactive_mode():
         selected_his = his_answer['his_file']
         console.print(f"[green]Selected .his file: {selected_his}[/green]")
 
-        # Step 4: Extract data
-        console.print("\n[bold]Step 4: Extracting data...[/bold]")
-        with Progress(SpinnerColumn(), TextColumn("[progress.description]{task.description}")) as progress:
-            task = progress.add_task("Loading data...", total=None)
-            dataset = extractor.extract_his_data(selected_his)
-            progress.update(task, description="Data loaded successfully!")
-
-        if dataset is None:
-            console.print("[red]Failed to extract data.[/red]")
-            return
-
-        # Step 5: Display summary and options
-        extractor.display_data_summary(dataset)
-
-        # Step 6: Processing options
+        # Step 4: Extract data in the background; actions that need it wait for it
+        console.print("\n[bold]Step 4: Loading data in the background...[/bold]")
+        data_future = loader.submit(("data", selected_his), extractor.extract_his_data, selected_his, True)
+        unused = loader.discard(("data", his_files[0])) if selected_his != his_files[0] else None
+        if unused is not None:
+            # Drop the speculative read of the file that was not chosen
+            unused_path = str(extractor.get_his_path(his_files[0]))
+            unused.add_done_callback(lambda _: extractor.readers.pop(unused_path, None))
+
+        # Derived data is memoized per session; aggregations no longer replace the original data
+        session_bytes = extractor.budget.max_bytes // 4 if extractor.budget is not None else 512 * 1024 ** 2
+        session = AnalysisSession(extractor, session_bytes)
+        aggregation = None
+        loaded = False
+
+        # Step 5: Processing options
         while True:
             console.print("\n[bold]Available Actions:[/bold]")
             actions = [
@@ -336,6 +873,7 @@ def interactive_mode():
                 "Aggregate data",
                 "Create plots",
                 "Export data",
+                "Refresh data (read new timesteps)",
                 "Exit"
             ]
 
@@ -347,24 +885,38 @@ def interactive_mode():
 
             action = action_answer['action']
 
+            if not loaded:
+                dataset = loader.result(data_future, "Loading data...")
+                if dataset is None:
+                    console.print("[red]Failed to extract data.[/red]")
+                    return
+                session.add_source(selected_his, dataset)
+                loaded = True
+                extractor.display_data_summary(dataset)
+
+            # Aggregated data is only computed by the actions that use it
             if action == "View detailed data":
                 # Show first few rows of data
-                df = dataset.to_dataframe()
                 console.print("\n[bold]Data Preview:[/bold]")
-                console.print(df.head().to_string())
+                console.print(session.preview(selected_his, aggregation).to_string())
 
             elif action == "Aggregate data":
-                agg_types = ["daily", "dekadal", "weekly", "monthly"]
+                agg_types = ["daily", "dekadal", "weekly", "monthly", "original data"]
                 agg_choices = [inquirer.List('agg_type', message="Select aggregation type", choices=agg_types)]
                 agg_answer = inquirer.prompt(agg_choices)
 
                 if agg_answer:
-                    dataset = extractor.aggregate_data(dataset, agg_answer['agg_type'])
-                    console.print(f"[green]Data aggregated using {agg_answer['agg_type']} method[/green]")
+                    # Aggregations are always made from the original data and are kept in the session
+                    aggregation = None if agg_answer['agg_type'] == "original data" else agg_answer['agg_type']
+                    dataset = session.dataset(selected_his, aggregation)
+                    if aggregation:
+                        console.print(f"[green]Data aggregated using {aggregation} method[/green]")
+                    else:
+                        console.print("[green]Using the original data[/green]")
                     extractor.display_data_summary(dataset)
 
             elif action == "Create plots":
-                parameters = list(dataset.data_vars.keys())
+                parameters = list(session.dataset(selected_his).data_vars.keys())
                 param_choices = [inquirer.List('parameter', message="Select parameter to plot", choices=parameters)]
                 param_answer = inquirer.prompt(param_choices)
 
@@ -375,7 +927,17 @@ def interactive_mode():
                         save_path = Prompt.ask("Enter save path (without extension)", default="ribasim_plot")
                         save_path += ".png"
 
-                    extractor.plot_data(dataset, param_answer['parameter'], save_path=save_path)
+                    plot_dataset = session.plot_dataset(selected_his, aggregation, param_answer['parameter'])
+                    extractor.plot_data(plot_dataset, param_answer['parameter'], save_path=save_path)
+
+            elif action == "Refresh data (read new timesteps)":
+                # Only timesteps written since the last read are decoded; derived data is recomputed on use
+                refreshed = extractor.extract_his_data(selected_his, follow=True)
+                if refreshed is not None:
+                    session.add_source(selected_his, refreshed)
+                    dataset = session.dataset(selected_his, aggregation)
+                    console.print(f"[green]Data refreshed: {dataset.sizes['time']} timestep(s) available[/green]")
+                    extractor.display_data_summary(dataset)
 
             elif action == "Export data":
                 export_formats = ["csv", "excel"]
@@ -385,7 +947,10 @@ def interactive_mode():
                 if format_answer:
                     output_path = Prompt.ask("Enter output filename (without extension)", default="ribasim_export")
                     export_format = format_answer['format']
-                    extractor.export_data(dataset, export_format, output_path)
+                    # Under a memory budget the export streams blocks instead of using a full data frame
+                    dataset = session.dataset(selected_his, aggregation)
+                    dataframe = session.dataframe(selected_his, aggregation) if extractor.budget is None else None
+                    extractor.export_data(dataset, export_format, output_path, dataframe)
 
                     # Show the equivalent CLI command
                     command = (
@@ -394,18 +959,26 @@ def interactive_mode():
                         f"--his-file \"{selected_his}\" "
                         f"--export \"{export_format}\""
                     )
+                    if aggregation:
+                        command += f" --aggregate \"{aggregation}\""
                     console.print("\n[bold cyan]CLI command to run this export directly:[/bold cyan]")
                     console.print(f"[cyan]{command}[/cyan]")
 
+        if extractor.budget is not None:
+            extractor.budget.report()
+
     except KeyboardInterrupt:
         console.print("\n[yellow]Operation cancelled by user.[/yellow]")
     except Exception as e:
         console.print(f"\n[red]Unexpected error: {e}[/red]")
+    finally:
+        loader.cancel_all()
 
 
-def cli_mode(basin: str, case: str, his_file: str, export: str):
+def cli_mode(basin: str, case: str, his_file: str, export: str, aggregate: Optional[str] = None,
+             max_memory: Optional[int] = None):
     """Run the application in non-interactive CLI mode."""
-    extractor = RibasimDataExtractor()
+    extractor = RibasimDataExtractor(max_memory=max_memory)
     extractor.selected_basin = basin
     extractor.selected_case = case
 
@@ -438,39 +1011,715 @@ def cli_mode(basin: str, case: str, his_file: str, export: str):
         console.print("[red]Failed to extract data.[/red]")
         return
 
+    if aggregate:
+        dataset = extractor.aggregate_data(dataset, aggregate)
+
     extractor.display_data_summary(dataset)
 
     # Export data
     if export:
-        if export.lower() not in ["csv", "excel"]:
-            console.print(f"[red]Error: Invalid export format '{export}'. Choose 'csv' or 'excel'.[/red]")
+        try:
+            export_formats = parse_export_formats(export)
+        except ValueError as e:
+            console.print(f"[red]Error: {e}[/red]")
             return
 
-        output_path = f"{Path(his_file).stem}_{export}"
-        console.print(f"\n[bold]Exporting data to {export.upper()}...[/bold]")
-        extractor.export_data(dataset, export, output_path)
+        output_path = f"{Path(his_file).stem}_{'_'.join(export_formats)}"
+        console.print(f"\n[bold]Exporting data to {', '.join(export_formats).upper()}...[/bold]")
+        extractor.export(dataset, export_formats, output_path)
+
+    if extractor.budget is not None:
+        extractor.budget.report()
+
+
+def run_export_pipeline(base: str, basin: str, case: str, his_file: str, export_formats: List[str],
+                        aggregate: Optional[str], output_path: str,
+                        max_memory: Optional[int] = None) -> List[str]:
+    """Read, optionally aggregate and export a single .his file; return the written paths."""
+    extractor = RibasimDataExtractor(base, max_memory)
+    extractor.selected_basin = basin
+    extractor.selected_case = case
 
+    dataset = extractor.extract_his_data(his_file)
+    if dataset is None:
+        return []
+
+    if aggregate:
+        dataset = extractor.aggregate_data(dataset, aggregate)
+
+    written = extractor.export(dataset, export_formats, output_path)
+    if extractor.budget is not None:
+        extractor.budget.report()
+    return written
+
+
+def run_watch_pipeline(base: str, basin: str, case: str, his_file: str, export_formats: List[str],
+                       aggregate: Optional[str], output_path: str,
+                       max_memory: Optional[int] = None) -> Tuple[List[str], str]:
+    """Hash a .his file and run the export pipeline on it; return the written paths and the hash."""
+    # Hashing in the worker keeps the polling loop cheap; the export reads the file from the page cache
+    content_hash = HisWatcher.content_hash(Path(base) / basin / case / his_file)
+    written = run_export_pipeline(base, basin, case, his_file, export_formats, aggregate, output_path,
+                                  max_memory)
+    return written, content_hash
+
+
+class HisWatcher:
+    """Watch a basin for new or modified .his files and re-export only those."""
+
+    manifest_name = ".extractor_manifest.json"
+
+    def __init__(self, extractor: RibasimDataExtractor, basin: str, export_formats: List[str],
+                 aggregate: Optional[str] = None, case: Optional[str] = None,
+                 output_dir: str = ".", debounce: float = 5.0, workers: int = 2,
+                 max_memory: Optional[int] = None, retry_delay: float = 60.0):
+        self.extractor = extractor
+        self.basin = basin
+        self.export_formats = export_formats
+        self.aggregate = aggregate
+        self.cases = [case] if case else [num for num, _ in extractor.get_available_cases(basin)]
+        # Outputs are recorded as absolute paths, so restarting from another folder finds them
+        self.output_dir = Path(output_dir).resolve()
+        self.debounce = debounce
+        self.workers = workers
+        # Every worker process gets an equal share of the memory budget
+        self.worker_memory = max_memory // workers if max_memory else None
+        self.manifest_path = extractor.base_path / basin / self.manifest_name
+        self.manifest = self.load_manifest()
+        # Sizes seen on the previous poll, used to skip files that are still growing
+        self._last_sizes: Dict[str, int] = {}
+        # Set when manifest entries were updated without re-exporting (e.g. a touched file)
+        self._manifest_dirty = False
+        # Failed pipelines are not recorded in the manifest, but retried at most every retry_delay seconds
+        self.retry_delay = retry_delay
+        self._failed: Dict[str, float] = {}
+
+    @property
+    def signature(self) -> str:
+        """Identify the pipeline settings so a changed export/aggregation re-runs everything."""
+        return f"{','.join(self.export_formats)}|{self.aggregate or 'none'}"
+
+    def load_manifest(self) -> Dict[str, dict]:
+        try:
+            if self.manifest_path.exists():
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            console.print(f"[yellow]Warning: Ignoring unreadable manifest {self.manifest_path}: {e}[/yellow]")
+        return {}
 
-@click.command()
+    def save_manifest(self):
+        try:
+            tmp_path = self.manifest_path.with_suffix(".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.manifest, f, indent=2)
+            tmp_path.replace(self.manifest_path)
+        except Exception as e:
+            console.print(f"[red]Error writing manifest {self.manifest_path}: {e}[/red]")
+
+    @staticmethod
+    def content_hash(path: Path) -> str:
+        """Hash the complete file, to tell a touched file from one with new results of the same size."""
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha1.update(block)
+        return sha1.hexdigest()
+
+    def output_path(self, case: str, his_file: str) -> str:
+        his_name = "_".join(Path(his_file).with_suffix("").parts)
+        return str(self.output_dir / f"{Path(self.basin).stem}_{case}_{his_name}_{'_'.join(self.export_formats)}")
+
+    def find_changed(self) -> List[Tuple[str, str, dict]]:
+        """Return (case, his_file, fingerprint) for settled files whose exports are out of date."""
+        changed = []
+        now = time.time()
+        seen_sizes = {}
+
+        for case in self.cases:
+            case_path = self.extractor.base_path / self.basin / case
+            for his_file in self.extractor.scan_his_files(self.basin, case):
+                key = f"{case}/{Path(his_file).as_posix()}"
+                try:
+                    stat = (case_path / his_file).stat()
+                except OSError:
+                    continue
+
+                seen_sizes[key] = stat.st_size
+                entry = self.manifest.get(key)
+                up_to_date = (entry is not None and entry["signature"] == self.signature and entry["outputs"]
+                              and all(Path(out).exists() for out in entry["outputs"]))
+                if up_to_date and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                    continue
+
+                # Debounce: the file must be quiet for a while and its size stable between polls
+                if now - stat.st_mtime < self.debounce or self._last_sizes.get(key) != stat.st_size:
+                    continue
+                if now - self._failed.get(key, float("-inf")) < self.retry_delay:
+                    continue
+
+                fingerprint = {"size": stat.st_size, "mtime": stat.st_mtime}
+                if up_to_date and entry["size"] == stat.st_size:
+                    # Only the modification time changed: hash to tell a touched file from new results
+                    try:
+                        content_hash = self.content_hash(case_path / his_file)
+                    except OSError:
+                        continue
+                    if entry.get("content_hash") == content_hash:
+                        entry.update(fingerprint)
+                        self._manifest_dirty = True
+                        continue
+
+                changed.append((case, his_file, fingerprint))
+
+        self._last_sizes = seen_sizes
+        return changed
+
+    def run_once(self, executor) -> int:
+        """Process every changed file once, returning the number of pipelines run."""
+        changed = self.find_changed()
+        if not changed:
+            if self._manifest_dirty:
+                self.save_manifest()
+                self._manifest_dirty = False
+            return 0
+
+        futures = {}
+        for case, his_file, fingerprint in changed:
+            console.print(f"[cyan]Change detected: case {case} / {his_file}[/cyan]")
+            future = executor.submit(
+                run_watch_pipeline, str(self.extractor.base_path), self.basin, case, his_file,
+                self.export_formats, self.aggregate, self.output_path(case, his_file), self.worker_memory
+            )
+            futures[future] = (case, his_file, fingerprint)
+
+        for future, (case, his_file, fingerprint) in futures.items():
+            key = f"{case}/{Path(his_file).as_posix()}"
+            try:
+                written, content_hash = future.result()
+            except Exception as e:
+                console.print(f"[red]Error processing {case}/{his_file}: {e}[/red]")
+                written, content_hash = [], None
+
+            if not written:
+                # Not recorded, so the file is retried (e.g. after an .xlsx output is closed in Excel)
+                console.print(f"[yellow]Will retry {case}/{his_file} in {self.retry_delay:g}s[/yellow]")
+                self._failed[key] = time.time()
+                continue
+            self._failed.pop(key, None)
+            self.manifest[key] = dict(
+                fingerprint, content_hash=content_hash, signature=self.signature, outputs=written
+            )
+
+        self.save_manifest()
+        self._manifest_dirty = False
+        return len(futures)
+
+    def run(self, interval: float = 10.0):
+        """Poll the basin until interrupted."""
+        console.print(f"[bold]Watching {self.basin} ({len(self.cases)} case(s)) every {interval:g}s. "
+                      f"Press Ctrl-C to stop.[/bold]")
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            try:
+                while True:
+                    processed = self.run_once(executor)
+                    if processed:
+                        console.print(f"[green]Re-exported {processed} file(s). Waiting for changes...[/green]")
+                    time.sleep(interval)
+            except KeyboardInterrupt:
+                console.print("\n[yellow]Watch mode stopped.[/yellow]")
+
+
+def watch_mode(basin: str, case: Optional[str], export: str, aggregate: Optional[str],
+               output_dir: str, interval: float, debounce: float, workers: int,
+               max_memory: Optional[int] = None):
+    """Run the application in watch mode, re-exporting changed .his files of a basin."""
+    extractor = RibasimDataExtractor()
+
+    if basin not in extractor.get_available_basins():
+        console.print(f"[red]Error: Basin '{basin}' not found.[/red]")
+        return
+
+    try:
+        export_formats = parse_export_formats(export)
+    except ValueError as e:
+        console.print(f"[red]Error: {e}[/red]")
+        return
+
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    watcher = HisWatcher(extractor, basin, export_formats, aggregate, case, output_dir, debounce, workers,
+                         max_memory)
+    watcher.run(interval)
+
+
+class DatasetPool:
+    """LRU pool of memory-mapped .his datasets, invalidated when a file changes on disk.
+
+    A mapped file cannot be rewritten on Windows, and reading a mapped file that was
+    truncated crashes the process on Linux. Datasets are therefore dropped (and their
+    mapping released) once they have not been used for idle_timeout seconds.
+    """
+
+    def __init__(self, capacity: int = 8, idle_timeout: float = 30.0):
+        self.capacity = capacity
+        self.idle_timeout = idle_timeout
+        self.hits = 0
+        self.misses = 0
+        self._datasets: "OrderedDict[str, Tuple[Tuple[int, float], object]]" = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._file_locks: Dict[str, threading.Lock] = {}
+
+    def _lookup(self, key: str, version: Tuple[int, float]):
+        with self._lock:
+            cached = self._datasets.get(key)
+            if cached is not None and cached[0] == version:
+                self._datasets.move_to_end(key)
+                self._last_used[key] = time.monotonic()
+                return cached[1]
+            return None
+
+    def evict_idle(self):
+        """Release the datasets that were not used within the idle timeout."""
+        deadline = time.monotonic() - self.idle_timeout
+        with self._lock:
+            for key in [key for key, used in self._last_used.items() if used < deadline]:
+                self._datasets.pop(key, None)
+                del self._last_used[key]
+
+    def get(self, path: Path):
+        key = str(path)
+        stat = path.stat()
+        version = (stat.st_size, stat.st_mtime)
+        dataset = self._lookup(key, version)
+        if dataset is None:
+            with self._lock:
+                file_lock = self._file_locks.setdefault(key, threading.Lock())
+            # Requests for the same cold file wait for one parse; other files are not blocked
+            with file_lock:
+                dataset = self._lookup(key, version)
+                if dataset is None:
+                    dataset = readhis(key, mmap=True)
+                    with self._lock:
+                        self.misses += 1
+                        self._datasets[key] = (version, dataset)
+                        self._last_used[key] = time.monotonic()
+                        while len(self._datasets) > self.capacity:
+                            evicted, _ = self._datasets.popitem(last=False)
+                            self._last_used.pop(evicted, None)
+                    return dataset
+
+        with self._lock:
+            self.hits += 1
+        return dataset
+
+    def __len__(self):
+        return len(self._datasets)
+
+
+class ServerMetrics:
+    """Request counts and latencies per endpoint."""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._latencies: Dict[str, deque] = {}
+        self._counts: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        with self._lock:
+            self._latencies.setdefault(endpoint, deque(maxlen=self.window)).append(seconds)
+            self._counts[endpoint] = self._counts.get(endpoint, 0) + 1
+            if not ok:
+                self._errors[endpoint] = self._errors.get(endpoint, 0) + 1
+
+    def snapshot(self, pool: DatasetPool) -> dict:
+        with self._lock:
+            endpoints = {}
+            for endpoint, latencies in self._latencies.items():
+                ordered = sorted(latencies)
+                endpoints[endpoint] = {
+                    "requests": self._counts[endpoint],
+                    "errors": self._errors.get(endpoint, 0),
+                    "latency_ms_mean": 1000 * sum(ordered) / len(ordered),
+                    "latency_ms_p50": 1000 * ordered[len(ordered) // 2],
+                    "latency_ms_p95": 1000 * ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+                }
+        lookups = pool.hits + pool.misses
+        return {
+            "endpoints": endpoints,
+            "cache": {
+                "datasets": len(pool),
+                "capacity": pool.capacity,
+                "hits": pool.hits,
+                "misses": pool.misses,
+                "hit_rate": pool.hits / lookups if lookups else None,
+            },
+        }
+
+
+class HTTPError(Exception):
+    """An error to be returned to the client with the given status code."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    """Serve the catalog, header metadata and data slices of the basins as JSON or Arrow."""
+
+    server: "QueryServer"
+
+    def log_message(self, format, *args):
+        pass  # latency and errors are tracked in the metrics instead
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        endpoint = url.path.rstrip("/") or "/"
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        routes = {
+            "/catalog": self.get_catalog,
+            "/header": self.get_header,
+            "/data": self.get_data,
+            "/metrics": self.get_metrics,
+        }
+
+        started = time.perf_counter()
+        ok = True
+        try:
+            if endpoint not in routes:
+                raise HTTPError(404, f"Unknown endpoint {endpoint}; use one of {sorted(routes)}")
+            body, content_type = routes[endpoint](query)
+            self.send_response(200)
+        except HTTPError as e:
+            ok = False
+            body, content_type = self.error_body(e.status, str(e))
+        except Exception as e:
+            ok = False
+            body, content_type = self.error_body(500, f"{type(e).__name__}: {e}")
+
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.metrics.record(endpoint, time.perf_counter() - started, ok)
+
+    def error_body(self, status: int, message: str) -> Tuple[bytes, str]:
+        self.send_response(status)
+        return self.json_body({"error": message})
+
+    @staticmethod
+    def json_body(payload) -> Tuple[bytes, str]:
+        return json.dumps(payload, default=str).encode("utf-8"), "application/json"
+
+    @staticmethod
+    def subfolder(parent: Path, name: str) -> Path:
+        """Resolve a basin or case name to an existing folder directly inside parent."""
+        path = (parent / name).resolve()
+        if path.parent != parent:
+            raise HTTPError(400, f"'{name}' is not a folder name")
+        if not path.is_dir():
+            raise HTTPError(404, f"Folder not found: {name}")
+        return path
+
+    def his_path(self, query: dict) -> Path:
+        """Resolve basin/case/file query parameters to a .his file inside the base path."""
+        missing = [key for key in ("basin", "case", "file") if not query.get(key)]
+        if missing:
+            raise HTTPError(400, f"Missing query parameter(s): {', '.join(missing)}")
+        base = self.server.extractor.base_path.resolve()
+        case_path = self.subfolder(self.subfolder(base, query["basin"]), query["case"])
+        path = (case_path / query["file"]).resolve()
+        if not path.is_relative_to(case_path) or path.suffix.lower() != ".his":
+            raise HTTPError(400, "Only .his files below the base path can be queried")
+        if not path.is_file():
+            raise HTTPError(404, f"File not found: {query['file']}")
+        return path
+
+    def get_catalog(self, query: dict):
+        extractor = self.server.extractor
+        basin, case = query.get("basin"), query.get("case")
+        if case and not basin:
+            raise HTTPError(400, "Missing query parameter(s): basin")
+        if basin:
+            # Validate before calling the extractor, which would only print errors to the server console
+            basin_path = self.subfolder(extractor.base_path.resolve(), basin)
+            if case:
+                self.subfolder(basin_path, case)
+                return self.json_body({"basin": basin, "case": case,
+                                       "his_files": extractor.scan_his_files(basin, case)})
+            if not (basin_path / "CASELIST.CMT").exists():
+                return self.json_body({"basin": basin, "cases": []})
+            cases = [{"case": num, "name": name} for num, name in extractor.get_available_cases(basin)]
+            return self.json_body({"basin": basin, "cases": cases})
+        return self.json_body({"basins": extractor.get_available_basins()})
+
+    def get_header(self, query: dict):
+        header = readhis_header(str(self.his_path(query)))
+        header.pop("locnrs")
+        return self.json_body(header)
+
+    def get_data(self, query: dict):
+        dataset = self.server.pool.get(self.his_path(query))
+        try:
+            if query.get("parameter"):
+                dataset = dataset[query["parameter"].split(",")]
+            if query.get("station"):
+                dataset = dataset.sel(station=query["station"].split(","))
+            if query.get("start") or query.get("end"):
+                dataset = dataset.sel(time=slice(query.get("start"), query.get("end")))
+        except (KeyError, ValueError) as e:
+            raise HTTPError(400, f"Invalid selection: {e}")
+        # Copy the slice out of the memory map so the response is built from private memory
+        dataset = dataset.copy(deep=True)
+
+        data_format = query.get("format", "json").lower()
+        if data_format == "arrow":
+            return self.arrow_body(dataset)
+        if data_format != "json":
+            raise HTTPError(400, f"Unsupported format '{data_format}'. Choose 'json' or 'arrow'.")
+
+        data = {}
+        for var_name in dataset.data_vars:
+            values = dataset[var_name].values.astype(object)
+            values[pd.isna(values)] = None
+            data[var_name] = values.tolist()
+        return self.json_body({
+            "time": [str(t) for t in pd.to_datetime(dataset.time.values)],
+            "station": [str(station) for station in dataset.station.values],
+            "data": data,
+        })
+
+    @staticmethod
+    def arrow_body(dataset) -> Tuple[bytes, str]:
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise HTTPError(501, "Arrow output requires the pyarrow package")
+        table = pa.Table.from_pandas(dataset.to_dataframe().reset_index(), preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes(), "application/vnd.apache.arrow.stream"
+
+    def get_metrics(self, query: dict):
+        return self.json_body(self.server.metrics.snapshot(self.server.pool))
+
+
+class QueryServer(HTTPServer):
+    """HTTP server that hands each request to a fixed thread pool."""
+
+    def __init__(self, port: int, extractor: RibasimDataExtractor, cache_size: int = 8, threads: int = 8,
+                 idle_timeout: float = 30.0):
+        # Only bind to the loopback interface; the service is for local dashboards
+        super().__init__(("127.0.0.1", port), QueryRequestHandler)
+        self.extractor = extractor
+        self.pool = DatasetPool(cache_size, idle_timeout)
+        self.metrics = ServerMetrics()
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+
+    def service_actions(self):
+        # Called by serve_forever between requests
+        self.pool.evict_idle()
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+def serve_mode(port: int, cache_size: int, threads: int, idle_timeout: float):
+    """Run the local query server until interrupted."""
+    server = QueryServer(port, RibasimDataExtractor(), cache_size, threads, idle_timeout)
+    console.print(f"[bold]Serving on http://127.0.0.1:{port} "
+                  f"(endpoints: /catalog, /header, /data, /metrics). Press Ctrl-C to stop.[/bold]")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        console.print("\n[yellow]Server stopped.[/yellow]")
+    finally:
+        server.server_close()
+
+
+def archive_mode(basin: str, output_dir: str, codec: Optional[str], time_block: int, station_block: int):
+    """Convert the .his files of a basin into one compressed archive and report ratio and throughput."""
+    extractor = RibasimDataExtractor()
+
+    if basin not in extractor.get_available_basins():
+        console.print(f"[red]Error: Basin '{basin}' not found.[/red]")
+        return
+
+    his_files = {}
+    for case, _ in extractor.get_available_cases(basin):
+        for his_file in extractor.scan_his_files(basin, case):
+            his_files[f"{case}/{Path(his_file).as_posix()}"] = str(extractor.base_path / basin / case / his_file)
+
+    if not his_files:
+        console.print(f"[red]No .his files found in basin '{basin}'.[/red]")
+        return
+
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    archive_path = Path(output_dir) / f"{Path(basin).stem}_archive.zip"
+    codec = codec or hisarchive.default_codec()
+
+    with Progress(SpinnerColumn(), TextColumn("[progress.description]{task.description}")) as progress:
+        task = progress.add_task(f"Archiving {len(his_files)} .his file(s) with {codec}...", total=None)
+        try:
+            indexes = hisarchive.create(archive_path, his_files, codec, time_block, station_block)
+        except Exception as e:
+            console.print(f"[red]Error creating archive: {e}[/red]")
+            return
+        progress.update(task, description=f"Archive written to {archive_path}")
+
+    table = Table(title=f"Archive {archive_path.name} ({codec})")
+    table.add_column("File", style="cyan")
+    table.add_column("Raw", style="magenta")
+    table.add_column("Archived", style="magenta")
+    table.add_column("Ratio", style="green")
+    table.add_column("Raw read MB/s", style="yellow")
+    table.add_column("Archive read MB/s", style="yellow")
+    table.add_column("1 station MB/s", style="yellow")
+
+    # Throughput is measured as raw .his megabytes delivered per second of reading
+    with hisarchive.Archive(archive_path) as archive:
+        for entry, index in indexes.items():
+            megabytes = index["filesize"] / 1024 ** 2
+            started = time.perf_counter()
+            dataset = readhis(his_files[entry])
+            raw_seconds = time.perf_counter() - started
+            started = time.perf_counter()
+            archive.read(entry)
+            archive_seconds = time.perf_counter() - started
+            # A single station only touches one block of stations
+            station = [str(dataset.station.values[0])] if dataset.sizes["station"] else None
+            started = time.perf_counter()
+            archive.read(entry, stations=station)
+            station_seconds = time.perf_counter() - started
+
+            table.add_row(
+                entry, format_size(index["filesize"]), format_size(index["stored_bytes"]),
+                f"{index['filesize'] / max(index['stored_bytes'], 1):.2f}x",
+                f"{megabytes / raw_seconds:.1f}", f"{megabytes / archive_seconds:.1f}",
+                f"{megabytes / station_seconds:.1f}",
+            )
+
+    raw_total = sum(index["filesize"] for index in indexes.values())
+    stored_total = archive_path.stat().st_size
+    console.print(table)
+    console.print(f"[green]Total: {format_size(raw_total)} -> {format_size(stored_total)} "
+                  f"({raw_total / max(stored_total, 1):.2f}x)[/green]")
+
+
+def restore_mode(archive_path: str, output_dir: str):
+    """Restore every .his file (and .hia) in an archive, byte for byte."""
+    try:
+        with hisarchive.Archive(archive_path) as archive:
+            for entry in archive.entries:
+                target = Path(output_dir) / entry
+                target.parent.mkdir(parents=True, exist_ok=True)
+                archive.restore(entry, str(target))
+                console.print(f"[green]Restored {target}[/green]")
+    except Exception as e:
+        console.print(f"[red]Error restoring archive {archive_path}: {e}[/red]")
+
+
+def _parse_max_memory(ctx, param, value) -> Optional[int]:
+    if value is None:
+        return None
+    try:
+        return parse_memory_size(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+@click.group(invoke_without_command=True)
+@click.pass_context
 @click.option('--basin', default=None, help='The basin name (e.g., "JCARWQV7.Rbd")')
 @click.option('--case', default=None, help='The case number (e.g., "1")')
 @click.option('--his-file', 'his_file', default=None, help='The .his file to process (relative to the case folder)')
-@click.option('--export', default=None, help='Export format: "csv" or "excel"')
-def main(basin: Optional[str], case: Optional[str], his_file: Optional[str], export: Optional[str]):
+@click.option('--export', default=None,
+              help='Export format: "csv", "excel" or "parquet"; comma separated for several in one pass')
+@click.option('--aggregate', type=click.Choice(["daily", "dekadal", "weekly", "monthly"]), default=None,
+              help='Aggregate the data before exporting')
+@click.option('--watch', is_flag=True, help='Keep watching the basin and re-export new or modified .his files')
+@click.option('--output-dir', 'output_dir', default=".", help='Folder for the files exported in watch mode')
+@click.option('--interval', default=10.0, help='Watch mode polling interval in seconds')
+@click.option('--debounce', default=5.0, help='Seconds a .his file must stay unchanged before it is processed')
+@click.option('--workers', default=2, help='Number of parallel export pipelines in watch mode')
+@click.option('--max-memory', 'max_memory', default=None, callback=_parse_max_memory,
+              help='Memory budget (e.g. "2GB"); reading, aggregation and export are chunked to stay under it')
+def main(ctx: click.Context, basin: Optional[str], case: Optional[str], his_file: Optional[str], export: Optional[str],
+         aggregate: Optional[str], watch: bool, output_dir: str, interval: float, debounce: float, workers: int,
+         max_memory: Optional[int]):
     """Main CLI interface.\n\nExample:   ribasim_extractor.py --basin "JCARWQV7.Rbd" --case "2" --his-file "TOTPLAN.HIS" --export "csv" """
     console.print(Panel.fit("""         🌊 Ribasim Data Extractor\n\nExtract & analyze Ribasim simulation results\n          By:  Eng. Hosam El-Nagar""", style="bold blue"))
 
+    # Subcommands (e.g. serve) run on their own
+    if ctx.invoked_subcommand:
+        if max_memory is not None:
+            console.print(f"[yellow]Warning: --max-memory is ignored by the {ctx.invoked_subcommand} command; "
+                          f"it applies to the interactive, CLI and watch modes.[/yellow]")
+        return
+
+    if watch:
+        if not all([basin, export]):
+            console.print("[red]Error: --basin and --export are required for watch mode.[/red]")
+            return
+        watch_mode(basin, case, export, aggregate, output_dir, interval, debounce, workers, max_memory)
     # If any CLI arguments are provided, run in non-interactive mode
-    if any([basin, case, his_file, export]):
+    elif any([basin, case, his_file, export]):
         if not all([basin, case, his_file]):
             console.print("[red]Error: --basin, --case, and --his-file are all required for non-interactive mode.[/red]")
             return
-        cli_mode(basin, case, his_file, export)
+        cli_mode(basin, case, his_file, export, aggregate, max_memory)
     else:
-        interactive_mode()
+        interactive_mode(max_memory)
 
     console.print("\n[green]Thank you for using Ribasim Data Extractor![/green]")
 
 
+@main.command()
+@click.option('--port', default=8765, help='Port on localhost to listen on')
+@click.option('--cache-size', 'cache_size', default=8, help='Number of recently used datasets kept memory-mapped')
+@click.option('--threads', default=8, help='Number of threads handling requests')
+@click.option('--idle-timeout', 'idle_timeout', default=30.0,
+              help='Seconds after which an unused dataset is released, so its .his file can be rewritten')
+def serve(port: int, cache_size: int, threads: int, idle_timeout: float):
+    """Serve catalog, header metadata and data slices over HTTP on localhost."""
+    serve_mode(port, cache_size, threads, idle_timeout)
+
+
+@main.command()
+@click.option('--basin', required=True, help='The basin whose .his files are archived (e.g., "JCARWQV7.Rbd")')
+@click.option('--output-dir', 'output_dir', default=".", help='Folder for the archive')
+@click.option('--codec', type=click.Choice(["zstd", "zlib", "lzma"]), default=None,
+              help='Compression codec (default: zstd if the zstandard package is installed, else zlib)')
+@click.option('--time-block', 'time_block', default=1024, help='Timesteps per chunk')
+@click.option('--station-block', 'station_block', default=64, help='Stations per chunk')
+def archive(basin: str, output_dir: str, codec: Optional[str], time_block: int, station_block: int):
+    """Convert the .his files of a basin into a compressed, chunked archive."""
+    archive_mode(basin, output_dir, codec, time_block, station_block)
+
+
+@main.command()
+@click.argument('archive_path')
+@click.option('--output-dir', 'output_dir', default=".", help='Folder to restore the .his files into')
+def restore(archive_path: str, output_dir: str):
+    """Restore the .his files of an archive, identical to the originals."""
+    restore_mode(archive_path, output_dir)
+
+
 if __name__ == "__main__":
     main()